@@ -0,0 +1,138 @@
+# coding=utf-8
+import os
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import bson
+from bson.raw_bson import RawBSONDocument
+import numpy as np
+from pymongo import MongoClient
+from datetime import datetime
+from person_generator import draw_person_columns
+
+
+MONGO_URI = "mongodb://localhost:27017/"
+
+# Settings of every client, in the main process and in the workers alike
+CLIENT_OPTIONS = {
+    "w": 1,  # acks on the primary only
+    "retryWrites": False,
+    "compressors": "zstd,snappy,zlib",  # shrinks the insert payloads
+    "zlibCompressionLevel": 3,
+    "maxPoolSize": 50,
+    "minPoolSize": 5,
+}
+
+
+@lru_cache(maxsize=None)
+def connect(mongo_uri: str = MONGO_URI) -> MongoClient:
+    """
+    Returns this process's client for mongo_uri, built from CLIENT_OPTIONS.
+    It is cached, so repeated model runs reuse the same connection pool.
+    """
+    return MongoClient(mongo_uri, **CLIENT_OPTIONS)
+
+
+def shard_companies(company_employees: list, n_workers: int) -> list:
+    """
+    Splits the (company, num_employees) pairs into one contiguous slice per worker.
+    """
+    step = -(-len(company_employees) // n_workers)
+    return [company_employees[start:start + step] for start in range(0, len(company_employees), step)]
+
+
+def _gen_and_insert(
+    seed, shape_company, company_slice, value_pools, mongo_uri, db_name, batch_size, max_batch_bytes
+):
+    """
+    Worker process: generates the documents of a slice of companies and inserts them.
+    shape_company(company, num_employees, columns, p, today, today_md) returns the
+    documents of one company, built from rows p .. p + num_employees of the columns.
+    Returns the number of persons inserted.
+    """
+    # Workers are spawned processes, so every worker opens its own client
+    collection = connect(mongo_uri)[db_name]["lab2_big_data"]
+
+    # --- Draw person columns from the shared value pools ----------------------
+    n_slice = sum(num_employees for _, num_employees in company_slice)
+    columns = draw_person_columns(value_pools, n_slice, seed)
+
+    buffer = []
+    buffer_bytes = 0
+    inserted_total = 0
+    p = 0  # position in the precomputed person columns
+    # Batches are inserted on background threads while the next one is built
+    insert_pool = ThreadPoolExecutor(max_workers=4)
+    in_flight = deque()  # (future, running total once that batch is in)
+    today = datetime.now()
+    today_md = (today.month, today.day)
+
+    def wait_oldest():
+        future, done_total = in_flight.popleft()
+        future.result()
+        print(f"{done_total:,} / {n_slice:,} persons inserted successfully (worker {os.getpid()})")
+
+    for company, num_employees in company_slice:
+        docs = shape_company(company, num_employees, columns, p, today, today_md)
+        p += num_employees
+        inserted_total += num_employees
+        if max_batch_bytes:
+            # Encode once here to measure the batch; insert_many sends the raw bytes as is
+            docs = [RawBSONDocument(bson.encode(doc)) for doc in docs]
+            buffer_bytes += sum(len(doc.raw) for doc in docs)
+        buffer.extend(docs)
+
+        # Insert in batches, flushing early if a byte budget is set and reached
+        if len(buffer) >= batch_size or (max_batch_bytes and buffer_bytes >= max_batch_bytes):
+            future = insert_pool.submit(collection.insert_many, buffer, ordered=False)
+            in_flight.append((future, inserted_total))
+            buffer = []  # the pending insert still holds the previous list
+            buffer_bytes = 0
+
+            # Backpressure: wait for the oldest batch once 8 are pending
+            if len(in_flight) >= 8:
+                wait_oldest()
+
+    # Insert any remaining documents in the buffer
+    if buffer:
+        future = insert_pool.submit(collection.insert_many, buffer, ordered=False)
+        in_flight.append((future, inserted_total))
+
+    # Wait for the remaining pending inserts
+    while in_flight:
+        wait_oldest()
+    insert_pool.shutdown()
+
+    return inserted_total
+
+
+def load_companies(
+    shape_company,
+    company_employees: list,
+    value_pools: dict,
+    mongo_uri: str,
+    db_name: str,
+    batch_size: int,
+    n_workers: int,
+    max_batch_bytes: int = None,
+) -> int:
+    """
+    Shards the (company, num_employees) pairs across worker processes, each with its
+    own seed, and inserts the documents shape_company builds for them.
+    shape_company must be a module-level function so the workers can import it.
+    Returns the number of persons inserted.
+    """
+    n_workers = max(1, min(n_workers, len(company_employees)))
+    slices = shard_companies(company_employees, n_workers)
+    base_seed = np.random.randint(0, 2**31 - n_workers)
+    chunks = [
+        (base_seed + w, shape_company, company_slice, value_pools,
+         mongo_uri, db_name, batch_size, max_batch_bytes)
+        for w, company_slice in enumerate(slices)
+    ]
+
+    # Spawned rather than forked: the caller already runs a MongoClient with
+    # live monitor threads, which must not be forked
+    with mp.get_context("spawn").Pool(len(chunks)) as workers:
+        return sum(workers.starmap(_gen_and_insert, chunks))
@@ -1,10 +1,27 @@
 # coding=utf-8
+import os
 import time
-import random
-from pymongo import MongoClient
+from itertools import islice
+from pymongo import ASCENDING, IndexModel
 from faker import Faker
 from datetime import datetime
 from tabulate import tabulate
+from person_generator import build_person, build_value_pools
+from loader import MONGO_URI, connect, load_companies
+
+
+def _shape_company(company_id, num_employees, columns, p, today, today_md):
+    """
+    Builds the person documents of one company, each referencing it by company_id.
+    """
+    return [
+        {
+            "type": "person",
+            **build_person(columns, i, today, today_md),
+            "company_id": company_id,
+        }
+        for i in range(p, p + num_employees)
+    ]
 
 
 class Model1:
@@ -18,17 +35,26 @@ class Model1:
         self,
         n_people: int = 99_000,
         n_companies: int = 1_000,
-        batch_size: int = 2_000,
-        mongo_uri: str = "mongodb://localhost:27017/",
+        batch_size: int = 5_000,
+        mongo_uri: str = MONGO_URI,
         db_name: str = "local",
-    ) -> None:
-        client = MongoClient(mongo_uri)
+        n_workers: int = os.cpu_count() or 1,
+        run_queries: bool = True,
+    ) -> float:
+        # Cached per process: workers and repeated runs use the same settings
+        client = connect(mongo_uri)
         db = client[db_name]
 
         # Clear and create collection
         db.drop_collection("lab2_big_data")
         collection = db.create_collection("lab2_big_data")
 
+        # Indexes for the per-company grouping of persons and the dateOfBirth filter in Q3
+        collection.create_indexes([
+            IndexModel([("type", ASCENDING), ("company_id", ASCENDING)]),
+            IndexModel([("type", ASCENDING), ("dateOfBirth", ASCENDING)]),
+        ])
+
         # Initialize Faker
         fake = Faker(["it_IT", "es_ES", "en_US"])
 
@@ -47,106 +73,87 @@ class Model1:
             companies.append(company)
 
         # Insert data
-        result = collection.insert_many(companies)
+        result = collection.insert_many(companies, ordered=False)
         company_ids = result.inserted_ids
         print(f"Inserted {len(company_ids)} Documents for companies successfully")
 
+        # --- Precompute value pools -------------------------------------------
+        # Shared with the workers, which draw the person columns from them
+        value_pools = build_value_pools(fake)
+
         # --- Generate persons with even distribution across companies ---------
         employees_per_company = n_people // n_companies
         extra_employees = n_people % n_companies  # remainder to distribute
+        company_employees = [
+            (company_id, employees_per_company + (1 if i < extra_employees else 0))
+            for i, company_id in enumerate(company_ids)
+        ]
 
         # Insert track time
         t0 = time.time()
-        buffer = []
-        inserted_total = 0
-
-        for i, company_id in enumerate(company_ids):
-            # Determine number of employees for this company
-            num_employees = employees_per_company + (1 if i < extra_employees else 0)
-            for _ in range(num_employees):
-                dob = fake.date_of_birth(minimum_age=18, maximum_age=70)
-                age = (
-                    datetime.now().year - dob.year
-                    - ((datetime.now().month, datetime.now().day) < (dob.month, dob.day))
-                )
-
-                person = {
-                    "type": "person",
-                    "age": age,
-                    "companyEmail": fake.company_email(),
-                    "dateOfBirth": datetime.combine(dob, datetime.min.time()),
-                    "email": fake.email(),
-                    "firstName": fake.first_name(),
-                    "fullName": fake.name(),
-                    "sex": random.choice(["M", "F"]),
-                    "company_id": company_id,
-                }
-                buffer.append(person)
-
-                # Insert in batches
-                if len(buffer) >= batch_size:
-                    collection.insert_many(buffer)
-                    inserted_total += len(buffer)
-                    print(f"{inserted_total:,} / {n_people:,} Documents for persons inserted successfully")
-                    buffer.clear()
-
-        # Insert any remaining documents in the buffer
-        if buffer:
-            collection.insert_many(buffer)
-            inserted_total += len(buffer)
-            print(f"{inserted_total:,} / {n_people:,} Documents for persons inserted successfully")
+        inserted_total = load_companies(
+            _shape_company, company_employees, value_pools, mongo_uri, db_name, batch_size, n_workers
+        )
 
         elapsed = time.time() - t0
         print(
-            f"Finished – {n_people:,} persons in {elapsed:.1f}s "
-            f"({n_people / max(elapsed, 1):,.0f} docs/s)"
+            f"Finished – {inserted_total:,} persons in {elapsed:.1f}s "
+            f"({inserted_total / max(elapsed, 1):,.0f} docs/s)"
         )
 
+        # Batch size sweeps only time the load
+        if not run_queries:
+            return elapsed
 
         ###################### Queries ######################################
         
         # Q1:  For each person, retrieve their full name and their company’s name
         start_time = time.time()
-        result = list(collection.aggregate([
-            { "$match": { "type": "person" } },
-            {
-                "$lookup": {
-                    "from": "lab2_big_data",
-                    "localField": "company_id",
-                    "foreignField": "_id",
-                    "as": "company"
-                }
-            },
-            { "$unwind": "$company" },
-            { "$project": {
-                "_id": 0,
-                "fullName": 1,
-                "companyName": "$company.name"
-            }}
-        ]))
+        # Hash join on the client: the company side is small enough to hold in a
+        # dict, so persons are streamed once instead of probing $lookup per person
+        company_names = {
+            doc["_id"]: doc["name"]
+            for doc in collection.find({ "type": "company" }, { "name": 1 })
+        }
+        rows = (
+            [doc["fullName"], company_names[doc["company_id"]]]
+            for doc in collection.find(
+                { "type": "person" },
+                { "_id": 0, "fullName": 1, "company_id": 1 }
+            )
+            if doc["company_id"] in company_names
+        )
+        # Stream the result: keep the first rows for display and drain the rest
+        table = list(islice(rows, 10))
+        for _ in rows:
+            pass
         query_time = time.time() - start_time
         print("Q1 Result--- %.4f seconds ---" % query_time)
         
-        table = [[entry['fullName'], entry['companyName']] for entry in result[:10]]
         print(tabulate(table, headers=["Full Name", "Company Name"], tablefmt="grid"))
 
         # Q2: For each company, retrieve its name and the number of employees
         start_time = time.time()
         result = list(collection.aggregate([
-            { "$match": { "type": "company" } },
+            # Count persons per company_id first, then join only the 1k group results
+            { "$match": { "type": "person" } },
+            { "$group": {
+                "_id": "$company_id",
+                "employeeCount": { "$sum": 1 }
+            }},
             {
                 "$lookup": {
                     "from": "lab2_big_data",
                     "localField": "_id",
-                    "foreignField": "company_id",
-                    "as": "employees"
+                    "foreignField": "_id",
+                    "as": "company"
                 }
             },
             {
                 "$project": {
                     "_id": 0,
-                    "companyName": "$name",
-                    "employeeCount": { "$size": "$employees" }
+                    "companyName": { "$arrayElemAt": ["$company.name", 0] },
+                    "employeeCount": 1
                 }
             }
         ]))
@@ -198,6 +205,8 @@ class Model1:
         table = [[doc["name"]] for doc in updated_companies]
         print(tabulate(table, headers=["Updated Company Name"], tablefmt="grid"))
 
+        return elapsed
+
 # Leaving the option to run the script directly
 if __name__ == "__main__":
     generator = Model1()
@@ -1,10 +1,32 @@
 # coding=utf-8
+import os
 import time
-import random
-from pymongo import MongoClient
+from itertools import islice
+import bson
+from bson.raw_bson import RawBSONDocument
+from pymongo import ASCENDING, IndexModel, UpdateMany
 from faker import Faker
 from datetime import datetime
 from tabulate import tabulate
+from person_generator import build_person, build_value_pools
+from loader import MONGO_URI, connect, load_companies
+
+
+def _shape_company(company, num_employees, columns, p, today, today_md):
+    """
+    Builds the person documents of one company, each embedding the company.
+    """
+    # Encode the embedded company once; PyMongo copies the raw bytes into
+    # each person instead of re-encoding the same dict for every employee
+    raw_company = RawBSONDocument(bson.encode(company))
+    return [
+        {
+            "type": "person",
+            **build_person(columns, i, today, today_md),
+            "company": raw_company,  # embedded company info
+        }
+        for i in range(p, p + num_employees)
+    ]
 
 
 class Model2:
@@ -20,17 +42,26 @@ class Model2:
         self,
         n_people: int = 99_000,
         n_companies: int = 1_000,
-        batch_size: int = 2_000,
-        mongo_uri: str = "mongodb://localhost:27017/",
+        batch_size: int = 5_000,
+        mongo_uri: str = MONGO_URI,
         db_name: str = "local",
-    ) -> None:
-        client = MongoClient(mongo_uri)
+        n_workers: int = os.cpu_count() or 1,
+        run_queries: bool = True,
+    ) -> float:
+        # Cached per process: workers and repeated runs use the same settings
+        client = connect(mongo_uri)
         db = client[db_name]
 
         # Clear and create collection
         db.drop_collection("lab2_big_data")
         collection = db.create_collection("lab2_big_data")
 
+        # Indexes for the company name used in Q4 and the dateOfBirth filter in Q3
+        collection.create_indexes([
+            IndexModel([("company.name", ASCENDING)]),
+            IndexModel([("type", ASCENDING), ("dateOfBirth", ASCENDING)]),
+        ])
+
         # Initialize Faker
         fake = Faker(["es_ES", "it_IT", "en_US"])
 
@@ -48,71 +79,48 @@ class Model2:
 
         print(f"Prepared {len(companies)} company templates")
 
+        # --- Precompute value pools -------------------------------------------
+        # Shared with the workers, which draw the person columns from them
+        value_pools = build_value_pools(fake)
+
         # --- Generate persons with embedded company ---------------------------
         employees_per_company = n_people // n_companies
         extra_employees = n_people % n_companies
+        company_employees = [
+            (company, employees_per_company + (1 if i < extra_employees else 0))
+            for i, company in enumerate(companies)
+        ]
 
         t0 = time.time()
-        buffer = []
-        inserted_total = 0
-
-        for i, company in enumerate(companies):
-            # Distribute people evenly among companies
-            num_employees = employees_per_company + (1 if i < extra_employees else 0)
-            for _ in range(num_employees):
-                dob = fake.date_of_birth(minimum_age=18, maximum_age=70)
-                age = (
-                    datetime.now().year - dob.year
-                    - ((datetime.now().month, datetime.now().day) < (dob.month, dob.day))
-                )
-                person = {
-                    "type": "person",
-                    "age": age,
-                    "companyEmail": fake.company_email(),
-                    "dateOfBirth": datetime.combine(dob, datetime.min.time()),
-                    "email": fake.email(),
-                    "firstName": fake.first_name(),
-                    "fullName": fake.name(),
-                    "sex": random.choice(["M", "F"]),
-                    "company": company,  # embedded company info
-                }
-                buffer.append(person)
-
-                # Insert in batches
-                if len(buffer) >= batch_size:
-                    collection.insert_many(buffer)
-                    inserted_total += len(buffer)
-                    print(f"{inserted_total:,} / {n_people:,} Documents for persons inserted successfully")
-                    buffer.clear()
-
-        if buffer:
-            collection.insert_many(buffer)
-            inserted_total += len(buffer)
-            print(f"{inserted_total:,} / {n_people:,} Documents for persons inserted successfully")
+        inserted_total = load_companies(
+            _shape_company, company_employees, value_pools, mongo_uri, db_name, batch_size, n_workers
+        )
 
         elapsed = time.time() - t0
         print(
-            f"Finished – {n_people:,} persons in {elapsed:.1f}s "
-            f"({n_people / max(elapsed, 1):,.0f} docs/s)"
+            f"Finished – {inserted_total:,} persons in {elapsed:.1f}s "
+            f"({inserted_total / max(elapsed, 1):,.0f} docs/s)"
         )
-        
-        
+
+        # Batch size sweeps only time the load
+        if not run_queries:
+            return elapsed
+
         ###################### Queries ######################################
 
         # Q1:  For each person, retrieve their full name and their company’s name
         start_time = time.time()
-        result = list(collection.find(
+        cursor = collection.find(
             { "type": "person" },
             { "_id": 0, "fullName": 1, "company.name": 1 }
-        ))
+        )
+        # Stream the result: keep the first rows for display and drain the rest
+        table = [[doc["fullName"], doc["company"]["name"]] for doc in islice(cursor, 10)]
+        for _ in cursor:
+            pass
         query_time = time.time() - start_time
         print("Q1 Result--- %.4f seconds ---" % query_time)
         
-        results = collection.find(
-            { "type": "person" },
-            { "_id": 0, "fullName": 1, "company.name": 1 }
-        ).limit(10)
-        table = [[doc["fullName"], doc["company"]["name"]] for doc in results]
         print(tabulate(table, headers=["Full Name", "Company Name"], tablefmt="grid"))
 
         # Q2: For each company, retrieve its name and the number of employees
@@ -161,21 +169,36 @@ class Model2:
 
         # Q4: For each company, update its name to include the word “Company”
         start_time = time.time()
-        result = collection.update_many(
-            { "type": "person" },
-            [{ "$set": { "company.name": { "$concat": ["$company.name", " Company"] } } }]
+        # Build each new name once on the client and rename all its employees with
+        # one indexed UpdateMany, instead of evaluating $concat on every person.
+        # Longest names go first and in order: a renamed name is always longer than
+        # every name still pending, so no person can be matched and renamed twice
+        # (e.g. "Foo" becoming "Foo Company" when "Foo Company" also exists).
+        company_names = sorted(
+            collection.distinct("company.name", { "type": "person" }), key=len, reverse=True
         )
+        # bulk_write rejects an empty list, e.g. when no persons were loaded
+        if company_names:
+            result = collection.bulk_write([
+                UpdateMany(
+                    { "type": "person", "company.name": name },
+                    { "$set": { "company.name": name + " Company" } }
+                )
+                for name in company_names
+            ], ordered=True)
         query_time = time.time() - start_time
 
         print("Q4 Result--- %.4f seconds ---" % query_time)
         
         updated_docs = collection.find(
             { "type": "person" },
-            { "_id": 0, "fullName": 1, "company.name": 1 }
+            { "_id": 0, "company.name": 1 }
         ).limit(10)
         table = [[doc["company"]["name"]] for doc in updated_docs]
         print(tabulate(table, headers=["Updated Company Name"], tablefmt="grid"))
 
+        return elapsed
+
 # Leaving the option to run the script directly
 if __name__ == "__main__":
     generator = Model2()
@@ -1,10 +1,29 @@
 # coding=utf-8
+import os
 import time
-import random
-from pymongo import MongoClient
+from pymongo import ASCENDING, IndexModel
 from faker import Faker
 from datetime import datetime
 from tabulate import tabulate
+from person_generator import build_person, build_value_pools
+from loader import MONGO_URI, connect, load_companies
+
+
+# Index serving Model3 Q2 as a covered query
+EMPLOYEE_COUNT_INDEX = [("type", ASCENDING), ("employeeCount", ASCENDING), ("name", ASCENDING)]
+
+
+def _shape_company(company_fields, num_employees, columns, p, today, today_md):
+    """
+    Builds one company document with its persons embedded as employees.
+    """
+    return [dict(
+        company_fields,
+        employeeCount=num_employees,  # materialized so Q2 needs no $size over the array
+        employees=[  # list of embedded person documents
+            build_person(columns, i, today, today_md) for i in range(p, p + num_employees)
+        ],
+    )]
 
 
 class Model3:
@@ -20,32 +39,38 @@ class Model3:
         self,
         n_people: int = 99_000,
         n_companies: int = 1_000,
-        batch_size: int = 100,
-        mongo_uri: str = "mongodb://localhost:27017/",
+        batch_size: int = 500,
+        mongo_uri: str = MONGO_URI,
         db_name: str = "local",
-    ) -> None:
-        client = MongoClient(mongo_uri)
+        n_workers: int = os.cpu_count() or 1,
+        max_batch_bytes: int = 12 * 1024 * 1024,
+        run_queries: bool = True,
+    ) -> float:
+        # Cached per process: workers and repeated runs use the same settings
+        client = connect(mongo_uri)
         db = client[db_name]
 
         # Clear and create collection
         db.drop_collection("lab2_big_data")
         collection = db.create_collection("lab2_big_data")
 
+        # Indexes for the embedded dateOfBirth filter in Q3 and the covered Q2
+        collection.create_indexes([
+            IndexModel([("employees.dateOfBirth", ASCENDING)]),
+            IndexModel(EMPLOYEE_COUNT_INDEX),
+        ])
+
         # Initialize Faker
         fake = Faker(["es_ES", "it_IT", "en_US"])
 
-        employees_per_company = n_people // n_companies
-        extra_employees = n_people % n_companies
-
-        t0 = time.time()
-        buffer = []
-        inserted_total = 0
+        # --- Precompute value pools -------------------------------------------
+        # Shared with the workers, which draw the person columns from them
+        value_pools = build_value_pools(fake)
 
-        for i in range(n_companies):
-            # Distribute employees evenly among companies
-            num_employees = employees_per_company + (1 if i < extra_employees else 0)
-
-            # Create company document
+        # --- Generate companies -----------------------------------------------
+        # Company fields are generated once here so the workers need no Faker
+        companies = []
+        for _ in range(n_companies):
             company = {
                 "type": "company",
                 "domain": fake.domain_name(),
@@ -53,66 +78,55 @@ class Model3:
                 "name": fake.company(),
                 "url": fake.url(),
                 "vatNumber": fake.bothify(text="??########"),
-                "employees": [],  # list of embedded person documents
             }
+            companies.append(company)
+
+        # Distribute employees evenly among companies
+        employees_per_company = n_people // n_companies
+        extra_employees = n_people % n_companies
+        company_employees = [
+            (company, employees_per_company + (1 if i < extra_employees else 0))
+            for i, company in enumerate(companies)
+        ]
 
-            # Generate and embed person documents
-            for _ in range(num_employees):
-                dob = fake.date_of_birth(minimum_age=18, maximum_age=70)
-                age = (
-                    datetime.now().year - dob.year
-                    - ((datetime.now().month, datetime.now().day) < (dob.month, dob.day))
-                )
-                person = {
-                    "age": age,
-                    "companyEmail": fake.company_email(),
-                    "dateOfBirth": datetime.combine(dob, datetime.min.time()),
-                    "email": fake.email(),
-                    "firstName": fake.first_name(),
-                    "fullName": fake.name(),
-                    "sex": random.choice(["M", "F"]),
-                }
-                company["employees"].append(person)
-
-            buffer.append(company)
-            inserted_total += num_employees
-
-            # Insert in batches
-            if len(buffer) >= batch_size:
-                collection.insert_many(buffer)
-                print(f"{inserted_total:,} / {n_people:,} Employees inserted into companies")
-                buffer.clear()
-
-        if buffer:
-            collection.insert_many(buffer)
-            print(f"{inserted_total:,} / {n_people:,} Employees inserted into companies")
+        t0 = time.time()
+        inserted_total = load_companies(
+            _shape_company, company_employees, value_pools, mongo_uri, db_name, batch_size, n_workers, max_batch_bytes=max_batch_bytes
+        )
 
         elapsed = time.time() - t0
         print(
             f"Finished – {inserted_total:,} persons embedded in companies in {elapsed:.1f}s "
             f"({inserted_total / max(elapsed, 1):,.0f} docs/s)"
         )
-        
-        
+
+        # Batch size sweeps only time the load
+        if not run_queries:
+            return elapsed
+
         ###################### Queries ######################################
         
         # Q1:  For each person, retrieve their full name and their company’s name
         start_time = time.time()
-        result = list(collection.aggregate([
+        cursor = collection.aggregate([
             { "$unwind": "$employees" },
             { "$project": {
                 "_id": 0,
                 "fullName": "$employees.fullName",
                 "companyName": "$name"
             }}
-        ]))
+        ], allowDiskUse=True)
+        # Stream the result instead of materializing every row
+        for _ in cursor:
+            pass
         query_time = time.time() - start_time
         print("Q1 Result--- %.4f seconds ---" % query_time)
         
+        # Three employees per company fill the 10 rows from at most 4 companies
         coll = collection.find(
             { "type": "company" },
             { "_id": 0, "name": 1, "employees.fullName": 1 }
-        )
+        ).limit(4)
         # Flatten company-employee pairs
         table = []
         for doc in coll:
@@ -127,18 +141,19 @@ class Model3:
 
         # Q2: For each company, retrieve its name and the number of employees
         start_time = time.time()
+        # Covered by the (type, employeeCount, name) index: no company document is fetched
         result = list(collection.find(
-            {},
-            { "_id": 0, "name": 1, "employeeCount": { "$size": "$employees" } }
-        ))
+            { "type": "company" },
+            { "_id": 0, "name": 1, "employeeCount": 1 }
+        ).hint(EMPLOYEE_COUNT_INDEX))
         query_time = time.time() - start_time
         print("Q2 Result--- %.4f seconds ---" % query_time)
         
         results = collection.find(
             { "type": "company" },
-            { "_id": 0, "name": 1, "employees": 1 }
+            { "_id": 0, "name": 1, "employeeCount": 1 }
         ).limit(10)
-        table = [[doc["name"], len(doc["employees"])] for doc in results]
+        table = [[doc["name"], doc["employeeCount"]] for doc in results]
         print(tabulate(table, headers=["Company Name", "Employee Count"], tablefmt="grid"))
 
 
@@ -146,30 +161,19 @@ class Model3:
         cutoff = datetime(1988, 1, 1)
 
         start_time = time.time()
-        companies = collection.find({ "employees.dateOfBirth": { "$lt": cutoff } })
-
-        modified_count = 0
-
-        # Since employees are embedded - update them in place
-        for company in companies:
-            updated_employees = []
-            modified = False
-            for emp in company["employees"]:
-                if emp["dateOfBirth"] < cutoff:
-                    emp["age"] = 30
-                    modified = True
-                updated_employees.append(emp)
-            if modified:
-                collection.update_one(
-                    { "_id": company["_id"] },
-                    { "$set": { "employees": updated_employees } }
-                )
-                modified_count += 1
+        # Since employees are embedded - update the matching ones in place on the server
+        result = collection.update_many(
+            { "employees.dateOfBirth": { "$lt": cutoff } },
+            { "$set": { "employees.$[emp].age": 30 } },
+            array_filters=[{ "emp.dateOfBirth": { "$lt": cutoff } }]
+        )
 
         query_time = time.time() - start_time
         print("Q3 Result--- %.4f seconds ---" % query_time)
         
+        # Only fetch companies holding an updated employee (indexed), then keep just those employees
         updated_docs = collection.aggregate([
+            { "$match": { "employees.dateOfBirth": { "$lt": cutoff } } },
             { "$unwind": "$employees" },
             { "$match": { "employees.dateOfBirth": { "$lt": cutoff } } },
             { "$project": {
@@ -202,6 +206,8 @@ class Model3:
 
         table = [[doc["name"]] for doc in updated_companies]
         print(tabulate(table, headers=["Updated Company Name"], tablefmt="grid"))
+
+        return elapsed
                 
 # Leaving the option to run the script directly
 if __name__ == "__main__":
@@ -2,8 +2,15 @@
 from model1 import Model1
 from model2 import Model2
 from model3 import Model3
+import os
 import sys
 from tabulate import tabulate
+from loader import MONGO_URI, shard_companies
+
+
+MODELS = {1: Model1, 2: Model2, 3: Model3}
+# Default sweep sizes: Model1/2 batches count persons, Model3 batches count companies
+SWEEP_SIZES = {1: [1_000, 2_000, 5_000, 10_000], 2: [1_000, 2_000, 5_000, 10_000], 3: [10, 25, 50, 100]}
 
 
 # Function to display available modeling options
@@ -13,33 +20,75 @@ def show_options():
     print("\t 1 - Model 1 (Person documents referencing Company)")
     print("\t 2 - Model 2 (Person documents with embedded Company)")
     print("\t 3 - Model 3 (Company documents with embedded Persons)")
+    print("\t 4 - Batch size sweep (insert time only)")
 
 
-show_options()
-op = int(input("Enter option: "))
+# Function to time the data load of one model for several batch sizes
+def batch_size_sweep(model_op, n_people, n_companies, batch_sizes):
+    # Each worker batches only its own slice, so larger sizes all give one batch per worker
+    n_workers = max(1, min(os.cpu_count() or 1, n_companies))
+    company_employees = [
+        (i, n_people // n_companies + (1 if i < n_people % n_companies else 0))
+        for i in range(n_companies)
+    ]
+    slices = shard_companies(company_employees, n_workers)
+    per_worker = max(
+        len(company_slice) if model_op == 3 else sum(n for _, n in company_slice)
+        for company_slice in slices
+    )
+    capped = sorted({min(batch_size, per_worker) for batch_size in batch_sizes})
+    if capped != sorted(set(batch_sizes)):
+        print(f"Batch sizes above the per-worker slice ({per_worker:,}) are capped to it")
 
-# While loop to keep running until exit option chosen
-while op != 0:
-    if op in [1, 2, 3]:
-        # Ask for user input 
-        n_people = int(input("Insert the number of employees to create: "))
-        n_companies = int(input("Insert the number of companies to create: "))
+    model = MODELS[model_op]()
+    table = []
+    for batch_size in capped:
+        elapsed = model.data_generator(
+            n_people=n_people,
+            n_companies=n_companies,
+            batch_size=batch_size,
+            run_queries=False,
+            mongo_uri=MONGO_URI,
+        )
+        table.append([batch_size, f"{elapsed:.2f}", f"{n_people / max(elapsed, 1e-9):,.0f}"])
+    print(tabulate(table, headers=["Batch size", "Insert time (s)", "Docs/s"], tablefmt="grid"))
 
-        # Instantiate selected model based on input
-        if op == 1:
-            m = Model1()
-        elif op == 2:
-            m = Model2()
-        elif op == 3:
-            m = Model3()
 
-        m.data_generator(n_people=n_people, n_companies=n_companies)
+# Guarded so the model worker processes can import this module safely
+if __name__ == "__main__":
+    show_options()
+    op = int(input("Enter option: "))
 
-    else:
-        # If 0 exit the program
-        print("Invalid option. Exiting ...")
-        sys.exit()
+    # While loop to keep running until exit option chosen
+    while op != 0:
+        if op in [1, 2, 3]:
+            # Ask for user input
+            n_people = int(input("Insert the number of employees to create: "))
+            n_companies = int(input("Insert the number of companies to create: "))
 
-    # Show options again after execution
-    show_options()
-    op = int(input("Enter option: "))
\ No newline at end of file
+            # Instantiate selected model based on input
+            m = MODELS[op]()
+
+            m.data_generator(n_people=n_people, n_companies=n_companies, mongo_uri=MONGO_URI)
+
+        elif op == 4:
+            model_op = int(input("Insert the model to sweep (1, 2 or 3): "))
+            if model_op in MODELS:
+                n_people = int(input("Insert the number of employees to create: "))
+                n_companies = int(input("Insert the number of companies to create: "))
+                default_sizes = SWEEP_SIZES[model_op]
+                sizes = input(f"Insert comma-separated batch sizes {default_sizes}: ")
+                batch_sizes = [int(s) for s in sizes.split(",")] if sizes.strip() else default_sizes
+
+                batch_size_sweep(model_op, n_people, n_companies, batch_sizes)
+            else:
+                print("Invalid model. Returning to the menu ...")
+
+        else:
+            # If 0 exit the program
+            print("Invalid option. Exiting ...")
+            sys.exit()
+
+        # Show options again after execution
+        show_options()
+        op = int(input("Enter option: "))
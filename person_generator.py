@@ -0,0 +1,68 @@
+# coding=utf-8
+import numpy as np
+from datetime import date, timedelta
+
+
+def build_value_pools(fake, pool_size: int = 8_000) -> dict:
+    """
+    Fills small pools of Faker values once per run.
+    Every per-person column is then drawn from them with NumPy instead of one Faker call per field.
+    """
+    return {
+        "firstName": np.array([fake.first_name() for _ in range(pool_size)]),
+        "fullName": np.array([fake.name() for _ in range(pool_size)]),
+        "email": np.array([fake.email() for _ in range(pool_size)]),
+        "companyEmail": np.array([fake.company_email() for _ in range(pool_size)]),
+    }
+
+
+def _years_ago(today: date, years: int) -> date:
+    """
+    Returns the same calendar date the given number of years back, Feb 29 falling back to Feb 28.
+    """
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+def draw_person_columns(value_pools: dict, n_people: int, seed: int) -> dict:
+    """
+    Draws n_people rows of person fields from the value pools, one column per field.
+    Columns are plain lists so the person loop indexes Python objects
+    rather than boxing a NumPy scalar per field.
+    """
+    np.random.seed(seed)
+    pool_size = len(value_pools["firstName"])
+    columns = {
+        field: pool[np.random.randint(0, pool_size, n_people)].tolist()
+        for field, pool in value_pools.items()
+    }
+    columns["sex"] = np.where(np.random.rand(n_people) < 0.5, "M", "F").tolist()
+
+    # Dates of birth uniformly spread over the 18-70 age range, as midnight datetimes
+    today = date.today()
+    youngest = _years_ago(today, 18)
+    oldest = _years_ago(today, 71) + timedelta(days=1)
+    dob_span = (youngest - oldest).days + 1
+    dob_days = np.datetime64(oldest, "D") + np.random.randint(0, dob_span, n_people).astype("timedelta64[D]")
+    columns["dateOfBirth"] = dob_days.astype("datetime64[ms]").tolist()
+
+    return columns
+
+
+def build_person(columns: dict, p: int, today, today_md: tuple) -> dict:
+    """
+    Builds the person fields shared by all three models from row p of the columns.
+    today and today_md = (today.month, today.day) are captured once by the caller.
+    """
+    dob = columns["dateOfBirth"][p]
+    return {
+        "age": today.year - dob.year - (today_md < (dob.month, dob.day)),
+        "companyEmail": columns["companyEmail"][p],
+        "dateOfBirth": dob,
+        "email": columns["email"][p],
+        "firstName": columns["firstName"][p],
+        "fullName": columns["fullName"][p],
+        "sex": columns["sex"][p],
+    }